@@ -22,9 +22,12 @@ $repoRoot = Split-Path -Parent $MyInvocation.MyCommand.Path
 $collectPs1 = Join-Path $repoRoot "src\collect.ps1"
 $reportPy = Join-Path $repoRoot "src\report.py"
 $thresholds = Join-Path $repoRoot "src\thresholds.json"
+# Shared Python helpers (html_report.py, json_compat.py, report_cache.py) live in the repo-level common folder
+$commonDir = Join-Path (Split-Path -Parent $repoRoot) "common"
 
 if (-not (Test-Path -LiteralPath $collectPs1)) { throw "Missing: $collectPs1" }
 if (-not (Test-Path -LiteralPath $reportPy)) { throw "Missing: $reportPy" }
+if (-not (Test-Path -LiteralPath $commonDir)) { throw "Missing: $commonDir" }
 if (-not (Test-Path -LiteralPath $thresholds)) { throw "Missing: $thresholds" }
 
 New-DirectoryIfMissing $OutRoot
@@ -45,6 +48,7 @@ Write-Step "Output: $outDir"
 if (-not $?) { throw "Collector failed." }
 
 # Generate report
+$env:PYTHONPATH = if ($env:PYTHONPATH) { "$commonDir;$env:PYTHONPATH" } else { $commonDir }
 & python $reportPy --outdir $outDir --thresholds $thresholds
 if ($LASTEXITCODE -ne 0) { throw "Report generation failed with exit code $LASTEXITCODE" }
 
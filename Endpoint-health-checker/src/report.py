@@ -1,35 +1,88 @@
 from __future__ import annotations
 
 import argparse
-import html
-import json
+from bisect import bisect_right
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from datetime import datetime
+from functools import lru_cache
+from operator import attrgetter
 from pathlib import Path
 from typing import Any, Dict, List, Tuple
 
-
-def read_json(path: Path) -> Any:
-    return json.loads(path.read_text(encoding="utf-8-sig"))
-
-
-def esc(x: Any) -> str:
-    return html.escape("" if x is None else str(x))
-
-
-def badge(status: str) -> str:
-    cls = {"OK": "ok", "WARN": "warn", "ALERT": "bad"}.get(status, "ok")
-    return f"<span class='badge {cls}'>{esc(status)}</span>"
+from html_report import (
+    badge_row,
+    esc_b,
+    iter_table,
+    record_row,
+    write_html_footer,
+    write_html_header,
+)
+from json_compat import json_dumps, read_json
+from report_cache import report_unchanged, rerun_digest, write_report_sig
+
+
+# rank orders findings ALERT, WARN, OK; it is set once when the finding is added
+Finding = namedtuple("Finding", "status category message rank")
+STATUS_RANK = {"ALERT": 0, "WARN": 1, "OK": 2}
+
+
+@dataclass(frozen=True)
+class Bands:
+    """
+    Maps a reading to (status, message) with one bisect over sorted cut points.
+    labels[i] is the (status, message template) for bisect_right(cuts, value) == i.
+    """
+
+    cuts: Tuple[float, float]
+    labels: Tuple[Tuple[str, str], Tuple[str, str], Tuple[str, str]]
+
+    def classify(self, value: float) -> Tuple[str, str]:
+        status, tmpl = self.labels[bisect_right(self.cuts, value)]
+        return status, tmpl.format(value)
+
+
+def build_bands(t: Dict[str, Any]) -> Dict[str, Bands]:
+    # Disk is low-is-bad (below alert => ALERT); CPU/Mem are high-is-bad (at or
+    # above alert => ALERT). The min/max keep the alert check winning, as the
+    # old if/elif chains did, when a warn threshold is set past its alert.
+    disk_alert = t["disk_free_alert_pct"]
+    cpu_alert = t["cpu_alert_pct"]
+    mem_alert = t["mem_used_alert_pct"]
+    return {
+        "disk": Bands(
+            cuts=(disk_alert, max(disk_alert, t["disk_free_warn_pct"])),
+            labels=(
+                ("ALERT", "Low disk space: {:.2f}% free"),
+                ("WARN", "Disk space getting low: {:.2f}% free"),
+                ("OK", "Disk space OK"),
+            ),
+        ),
+        "cpu": Bands(
+            cuts=(min(cpu_alert, t["cpu_warn_pct"]), cpu_alert),
+            labels=(
+                ("OK", "CPU load OK: {:.2f}%"),
+                ("WARN", "Elevated CPU load: {:.2f}%"),
+                ("ALERT", "High CPU load: {:.2f}%"),
+            ),
+        ),
+        "mem": Bands(
+            cuts=(min(mem_alert, t["mem_used_warn_pct"]), mem_alert),
+            labels=(
+                ("OK", "Memory usage OK: {:.2f}%"),
+                ("WARN", "Elevated memory usage: {:.2f}%"),
+                ("ALERT", "High memory usage: {:.2f}%"),
+            ),
+        ),
+    }
 
 
-def classify_disk(d: Dict[str, Any], t: Dict[str, Any]) -> Tuple[str, str]:
+def classify_disk(d: Dict[str, Any], bands: Dict[str, Bands]) -> Tuple[str, str]:
     pct = d.get("FreePercent")
     if pct is None:
         return "WARN", "No disk size/free data"
-    if pct < t["disk_free_alert_pct"]:
-        return "ALERT", f"Low disk space: {pct:.2f}% free"
-    if pct < t["disk_free_warn_pct"]:
-        return "WARN", f"Disk space getting low: {pct:.2f}% free"
-    return "OK", "Disk space OK"
+    return bands["disk"].classify(pct)
 
 
 def ensure_list(x):
@@ -41,104 +94,84 @@ def ensure_list(x):
     return [x]
 
 
+@lru_cache(maxsize=1024)
+def service_key(name: str) -> str:
+    # Service names repeat across hosts and runs; fold each distinct one once
+    return name.strip().casefold()
+
+
 def classify_resource(
-    r: Dict[str, Any], t: Dict[str, Any]
+    r: Dict[str, Any], bands: Dict[str, Bands]
 ) -> List[Tuple[str, str, str]]:
     out = []
     cpu = r.get("CpuLoadPercent")
     mem = r.get("MemoryUsedPercent")
 
     if cpu is not None:
-        if cpu >= t["cpu_alert_pct"]:
-            out.append(("ALERT", "CPU", f"High CPU load: {cpu:.2f}%"))
-        elif cpu >= t["cpu_warn_pct"]:
-            out.append(("WARN", "CPU", f"Elevated CPU load: {cpu:.2f}%"))
-        else:
-            out.append(("OK", "CPU", f"CPU load OK: {cpu:.2f}%"))
+        status, msg = bands["cpu"].classify(cpu)
+        out.append((status, "CPU", msg))
     else:
         out.append(("WARN", "CPU", "CPU load unavailable"))
 
     if mem is not None:
-        if mem >= t["mem_used_alert_pct"]:
-            out.append(("ALERT", "Memory", f"High memory usage: {mem:.2f}%"))
-        elif mem >= t["mem_used_warn_pct"]:
-            out.append(("WARN", "Memory", f"Elevated memory usage: {mem:.2f}%"))
-        else:
-            out.append(("OK", "Memory", f"Memory usage OK: {mem:.2f}%"))
+        status, msg = bands["mem"].classify(mem)
+        out.append((status, "Memory", msg))
     else:
         out.append(("WARN", "Memory", "Memory usage unavailable"))
 
     return out
 
 
-def make_table(headers: List[str], rows: List[List[Any]]) -> str:
-    th = "".join(f"<th>{esc(h)}</th>" for h in headers)
-    if not rows:
-        body = f"<tr><td colspan='{len(headers)}'><i>No data</i></td></tr>"
-    else:
-        body = "".join(
-            "<tr>" + "".join(f"<td>{esc(c)}</td>" for c in r) + "</tr>" for r in rows
-        )
-    return f"<table><thead><tr>{th}</tr></thead><tbody>{body}</tbody></table>"
+# Source-dict keys for each table's columns, in header order
+DISK_KEYS = (
+    "Drive",
+    "SizeGB",
+    "FreeGB",
+    "FreePercent",
+    "VolumeName",
+    "_status",
+    "_note",
+)
+SERVICE_KEYS = ("Name", "DisplayName", "State", "StartMode")
+DEFENDER_KEYS = ("Available", "RealTimeProtectionEnabled", "AntivirusEnabled", "Notes")
+
+# Page-specific meta block; the %s holes are filled with esc_b() values
+HTML_META_REBOOT = b"""  <div class="meta">
+    <div><b>%s</b> %s</div>
+"""
 
+HTML_META_THRESHOLDS = b"""    <div><b>Thresholds:</b> Disk warn %s%% / alert %s%%,
+      CPU warn %s%% / alert %s%%,
+      Mem warn %s%% / alert %s%%</div>
+  </div>
 
-def build_html(data: Dict[str, Any]) -> str:
-    sysinfo = data["system_info"]
-    thresholds = data["thresholds"]
+  <h2>Summary</h2>
+  """
 
-    generated = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-
-    # Summary counts
-    alerts = [x for x in data["findings"] if x["status"] == "ALERT"]
-    warns = [x for x in data["findings"] if x["status"] == "WARN"]
-
-    summary = make_table(
-        ["Host", "OS", "Uptime (hrs)", "Alerts", "Warnings", "Generated"],
-        [
-            [
-                sysinfo.get("Hostname", ""),
-                sysinfo.get("OS", ""),
-                sysinfo.get("UptimeHours", ""),
-                str(len(alerts)),
-                str(len(warns)),
-                generated,
-            ]
-        ],
-    )
+# thresholds.json keys shown in the meta block, in HTML_META_THRESHOLDS order
+META_THRESHOLD_KEYS = (
+    "disk_free_warn_pct",
+    "disk_free_alert_pct",
+    "cpu_warn_pct",
+    "cpu_alert_pct",
+    "mem_used_warn_pct",
+    "mem_used_alert_pct",
+)
 
-    findings_rows = [
-        [badge(f["status"]), f["category"], f["message"]] for f in data["findings"]
-    ]
-    findings_tbl = make_table(["Status", "Category", "Details"], findings_rows)
-
-    disks_tbl = make_table(
-        ["Drive", "SizeGB", "FreeGB", "Free%", "Volume", "Status", "Notes"],
-        [
-            [
-                d.get("Drive", ""),
-                d.get("SizeGB", ""),
-                d.get("FreeGB", ""),
-                d.get("FreePercent", ""),
-                d.get("VolumeName", ""),
-                d.get("_status", ""),
-                d.get("_note", ""),
-            ]
-            for d in data["disk"]
-        ],
-    )
 
-    services_tbl = make_table(
-        ["Name", "DisplayName", "State", "StartMode"],
-        [
-            [
-                s.get("Name", ""),
-                s.get("DisplayName", ""),
-                s.get("State", ""),
-                s.get("StartMode", ""),
-            ]
-            for s in data["auto_services_stopped"]
-        ],
-    )
+@lru_cache(maxsize=8)
+def thresholds_meta(values: Tuple[Any, ...]) -> bytes:
+    # Only changes when thresholds.json does, so repeat renders reuse the bytes
+    return HTML_META_THRESHOLDS % tuple(esc_b(v) for v in values)
+
+
+def write_html(
+    path: Path, data: Dict[str, Any], status_counts: Dict[str, int], now: datetime
+) -> None:
+    sysinfo = data["system_info"]
+    thresholds = data["thresholds"]
+
+    generated = now.strftime("%Y-%m-%d %H:%M:%S")
 
     reboot = data["reboot"]
     reboot_line = (
@@ -149,63 +182,68 @@ def build_html(data: Dict[str, Any]) -> str:
     )
 
     defender = data["defender"]
-    defender_tbl = make_table(
-        ["Available", "RealTimeProtectionEnabled", "AntivirusEnabled", "Notes"],
-        [
-            [
-                defender.get("Available"),
-                defender.get("RealTimeProtectionEnabled"),
-                defender.get("AntivirusEnabled"),
-                defender.get("Notes"),
-            ]
-        ],
-    )
 
-    return f"""<!doctype html>
-<html>
-<head>
-  <meta charset="utf-8" />
-  <title>Endpoint Health Report - {esc(sysinfo.get("Hostname", ""))}</title>
-  <style>
-    body {{ font-family: Segoe UI, Arial, sans-serif; margin: 24px; }}
-    h1 {{ margin-bottom: 6px; }}
-    .meta {{ color: #555; margin-bottom: 18px; }}
-    .badge {{ display: inline-block; padding: 2px 8px; border-radius: 999px; font-weight: 700; font-size: 12px; }}
-    .ok {{ background: #e9f7ef; }}
-    .warn {{ background: #fff4e5; }}
-    .bad {{ background: #fdecea; }}
-    table {{ border-collapse: collapse; width: 100%; margin: 10px 0 22px; }}
-    th, td {{ border: 1px solid #ddd; padding: 8px; font-size: 14px; vertical-align: top; }}
-    th {{ text-align: left; background: #f6f6f6; }}
-    code {{ background: #f4f4f4; padding: 2px 4px; border-radius: 4px; }}
-  </style>
-</head>
-<body>
-  <h1>Endpoint Health Report</h1>
-  <div class="meta">
-    <div><b>{esc(reboot_line)}</b> {esc(reboot_reasons)}</div>
-    <div><b>Thresholds:</b> Disk warn {esc(thresholds["disk_free_warn_pct"])}% / alert {esc(thresholds["disk_free_alert_pct"])}%,
-      CPU warn {esc(thresholds["cpu_warn_pct"])}% / alert {esc(thresholds["cpu_alert_pct"])}%,
-      Mem warn {esc(thresholds["mem_used_warn_pct"])}% / alert {esc(thresholds["mem_used_alert_pct"])}%</div>
-  </div>
+    meta = HTML_META_REBOOT % (esc_b(reboot_line), esc_b(reboot_reasons))
+    meta += thresholds_meta(tuple(thresholds[k] for k in META_THRESHOLD_KEYS))
 
-  <h2>Summary</h2>
-  {summary}
+    with path.open("wb") as f:
+        write_html_header(
+            f,
+            f"Endpoint Health Report - {sysinfo.get('Hostname', '')}",
+            "Endpoint Health Report",
+        )
+        f.write(meta)
+        f.writelines(
+            iter_table(
+                ["Host", "OS", "Uptime (hrs)", "Alerts", "Warnings", "Generated"],
+                [
+                    [
+                        sysinfo.get("Hostname", ""),
+                        sysinfo.get("OS", ""),
+                        sysinfo.get("UptimeHours", ""),
+                        str(status_counts["ALERT"]),
+                        str(status_counts["WARN"]),
+                        generated,
+                    ]
+                ],
+            )
+        )
 
-  <h2>Findings</h2>
-  {findings_tbl}
+        f.write(b"\n\n  <h2>Findings</h2>\n  ")
+        f.writelines(
+            iter_table(
+                ["Status", "Category", "Details"],
+                (
+                    badge_row(x.status, [x.category, x.message])
+                    for x in data["findings"]
+                ),
+            )
+        )
 
-  <h2>Disks</h2>
-  {disks_tbl}
+        f.write(b"\n\n  <h2>Disks</h2>\n  ")
+        f.writelines(
+            iter_table(
+                ["Drive", "SizeGB", "FreeGB", "Free%", "Volume", "Status", "Notes"],
+                (record_row(d, DISK_KEYS) for d in data["disk"]),
+            )
+        )
 
-  <h2>Auto Services Stopped</h2>
-  {services_tbl}
+        f.write(b"\n\n  <h2>Auto Services Stopped</h2>\n  ")
+        f.writelines(
+            iter_table(
+                ["Name", "DisplayName", "State", "StartMode"],
+                (record_row(s, SERVICE_KEYS) for s in data["auto_services_stopped"]),
+            )
+        )
 
-  <h2>Defender</h2>
-  {defender_tbl}
-</body>
-</html>
-"""
+        f.write(b"\n\n  <h2>Defender</h2>\n  ")
+        f.writelines(
+            iter_table(
+                ["Available", "RealTimeProtectionEnabled", "AntivirusEnabled", "Notes"],
+                [record_row(defender, DEFENDER_KEYS)],
+            )
+        )
+        write_html_footer(f)
 
 
 def main() -> int:
@@ -216,84 +254,81 @@ def main() -> int:
     ap.add_argument("--thresholds", required=True)
     args = ap.parse_args()
 
+    now = datetime.now()
     outdir = Path(args.outdir)
-    t = read_json(Path(args.thresholds))
+    sources = {
+        "thresholds": Path(args.thresholds),
+        "system_info": outdir / "system_info.json",
+        "disk": outdir / "disk.json",
+        "resource": outdir / "resource.json",
+        "services": outdir / "services.json",
+        "reboot": outdir / "reboot.json",
+        "defender": outdir / "defender.json",
+    }
+
+    # Read the inputs concurrently; the output folder is often on a network share
+    # where each read is a round trip. result() re-raises any read/parse error.
+    with ThreadPoolExecutor(max_workers=len(sources)) as ex:
+        futures = {name: ex.submit(read_json, path) for name, path in sources.items()}
+    loaded = {name: fut.result() for name, fut in futures.items()}
 
-    sysinfo = read_json(outdir / "system_info.json")
-    disks = ensure_list(read_json(outdir / "disk.json"))
-    resource = read_json(outdir / "resource.json")
-    services = ensure_list(read_json(outdir / "services.json"))
-    reboot = read_json(outdir / "reboot.json")
-    defender = read_json(outdir / "defender.json")
+    t = loaded["thresholds"]
+    sysinfo = loaded["system_info"]
+    disks = ensure_list(loaded["disk"])
+    resource = loaded["resource"]
+    services = ensure_list(loaded["services"])
+    reboot = loaded["reboot"]
+    defender = loaded["defender"]
 
-    findings: List[Dict[str, str]] = []
+    findings: List[Finding] = []
+    # Tallied as findings are added so the summary never re-scans the list
+    status_counts = {"ALERT": 0, "WARN": 0, "OK": 0}
+
+    def add_finding(status: str, category: str, message: str) -> None:
+        findings.append(Finding(status, category, message, STATUS_RANK.get(status, 9)))
+        status_counts[status] = status_counts.get(status, 0) + 1
 
     # Disk findings + annotate
+    bands = build_bands(t)
     for d in disks:
-        status, note = classify_disk(d, t)
+        status, note = classify_disk(d, bands)
         d["_status"] = status
         d["_note"] = note
         if status != "OK":
-            findings.append(
-                {
-                    "status": status,
-                    "category": f"Disk {d.get('Drive', '')}",
-                    "message": note,
-                }
-            )
+            add_finding(status, f"Disk {d.get('Drive', '')}", note)
 
     # CPU/Mem findings
-    for status, cat, msg in classify_resource(resource, t):
+    for status, cat, msg in classify_resource(resource, bands):
         if status != "OK":
-            findings.append({"status": status, "category": cat, "message": msg})
+            add_finding(status, cat, msg)
 
     # Services findings (exclude allowlist)
-    allow = set(x.lower() for x in t.get("service_allowlist", []))
-    auto_stopped = []
-    for s in services:
-        name = (s.get("Name") or "").strip()
-        if name.lower() in allow:
-            continue
-        auto_stopped.append(s)
+    allow = frozenset(x.casefold() for x in t.get("service_allowlist", []))
+    auto_stopped = [
+        s for s in services if service_key(s.get("Name") or "") not in allow
+    ]
 
     if auto_stopped:
-        findings.append(
-            {
-                "status": "WARN",
-                "category": "Services",
-                "message": f"{len(auto_stopped)} Automatic service(s) not running",
-            }
+        add_finding(
+            "WARN", "Services", f"{len(auto_stopped)} Automatic service(s) not running"
         )
 
     # Pending reboot
     if reboot.get("Pending"):
-        findings.append(
-            {
-                "status": "WARN",
-                "category": "Reboot",
-                "message": "Pending reboot detected",
-            }
-        )
+        add_finding("WARN", "Reboot", "Pending reboot detected")
 
     # Defender
     if (
         defender.get("Available") is True
         and defender.get("RealTimeProtectionEnabled") is False
     ):
-        findings.append(
-            {
-                "status": "WARN",
-                "category": "Defender",
-                "message": "Real-time protection is disabled",
-            }
-        )
+        add_finding("WARN", "Defender", "Real-time protection is disabled")
 
     # Sort findings: ALERT first, then WARN
-    order = {"ALERT": 0, "WARN": 1, "OK": 2}
-    findings.sort(key=lambda x: order.get(x["status"], 9))
+    findings.sort(key=attrgetter("rank"))
 
     report_obj = {
-        "generated_at": datetime.now().isoformat(timespec="seconds"),
+        "generated_at": now.isoformat(timespec="seconds"),
         "thresholds": t,
         "system_info": sysinfo,
         "disk": disks,
@@ -304,10 +339,22 @@ def main() -> int:
         "findings": findings,
     }
 
-    (outdir / "report.json").write_text(
-        json.dumps(report_obj, indent=2), encoding="utf-8"
-    )
-    (outdir / "report.html").write_text(build_html(report_obj), encoding="utf-8")
+    # Findings are namedtuples in memory but stay objects in report.json
+    findings_json = [
+        {"status": f.status, "category": f.category, "message": f.message}
+        for f in findings
+    ]
+    report_json = {**report_obj, "findings": findings_json}
+
+    # Re-running against the same outdir with the same data leaves the files alone
+    digest = rerun_digest(outdir, report_json)
+    if digest is not None and report_unchanged(outdir, digest):
+        print(f"Unchanged: {outdir / 'report.html'}")
+        return 0
+
+    (outdir / "report.json").write_bytes(json_dumps(report_json))
+    write_html(outdir / "report.html", report_obj, status_counts, now)
+    write_report_sig(outdir, digest)
 
     print(f"Wrote: {outdir / 'report.html'}")
     print(f"Wrote: {outdir / 'report.json'}")
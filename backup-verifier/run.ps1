@@ -26,6 +26,8 @@ function Ensure-Dir($path) {
 
 $repoRoot = Split-Path -Parent $MyInvocation.MyCommand.Path
 $reportPy = Join-Path $repoRoot "src\report.py"
+# Shared Python helpers (html_report.py, json_compat.py, report_cache.py) live in the repo-level common folder
+$commonDir = Join-Path (Split-Path -Parent $repoRoot) "common"
 
 # Defaults (sample mode)
 if ([string]::IsNullOrWhiteSpace($InputCsv)) {
@@ -36,6 +38,7 @@ if ([string]::IsNullOrWhiteSpace($Thresholds)) {
 }
 
 if (-not (Test-Path -LiteralPath $reportPy)) { throw "Missing: $reportPy" }
+if (-not (Test-Path -LiteralPath $commonDir)) { throw "Missing: $commonDir" }
 if (-not (Test-Path -LiteralPath $InputCsv)) { throw "Missing: $InputCsv" }
 if (-not (Test-Path -LiteralPath $Thresholds)) { throw "Missing: $Thresholds" }
 
@@ -54,6 +57,7 @@ Write-Step "Input CSV: $InputCsv"
 Write-Step "Thresholds: $Thresholds"
 Write-Step "Output: $outDir"
 
+$env:PYTHONPATH = if ($env:PYTHONPATH) { "$commonDir;$env:PYTHONPATH" } else { $commonDir }
 & python $reportPy --input $InputCsv --thresholds $Thresholds --outdir $outDir
 if ($LASTEXITCODE -ne 0) { throw "Report generation failed with exit code $LASTEXITCODE" }
 
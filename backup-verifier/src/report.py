@@ -2,14 +2,32 @@ from __future__ import annotations
 
 import argparse
 import csv
-import html
-import json
-from dataclasses import dataclass
+import io
+from dataclasses import dataclass, field
 from datetime import datetime, timezone
+from functools import lru_cache
+from operator import attrgetter
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Tuple
-
-
+from typing import Any, Dict, FrozenSet, List, Optional, Tuple
+
+from html_report import (
+    TABLE_CLOSE,
+    badge_row,
+    esc_b,
+    iter_buffered_table,
+    iter_table,
+    no_data_row,
+    table_open,
+    table_row,
+    write_html_footer,
+    write_html_header,
+)
+from json_compat import json_dumps, read_json
+from report_cache import report_unchanged, rerun_digest, write_report_sig
+
+
+# Sibling jobs often share a run window, so timestamps repeat across rows
+@lru_cache(maxsize=4096)
 def parse_dt(s: str) -> Optional[datetime]:
     s = (s or "").strip()
     if not s:
@@ -40,8 +58,15 @@ class Job:
     notes: str
 
     @staticmethod
-    def from_row(r: Dict[str, str]) -> "Job":
-        dur_raw = (r.get("duration_minutes") or "").strip()
+    def from_fields(
+        job_name: str,
+        last_run: str,
+        last_result: str,
+        last_success: str,
+        duration_minutes: str,
+        notes: str,
+    ) -> "Job":
+        dur_raw = duration_minutes.strip()
         dur = None
         if dur_raw:
             try:
@@ -50,68 +75,153 @@ class Job:
                 dur = None
 
         return Job(
-            job_name=(r.get("job_name") or "").strip(),
-            last_run=parse_dt(r.get("last_run") or ""),
-            last_result=(r.get("last_result") or "").strip(),
-            last_success=parse_dt(r.get("last_success") or ""),
+            job_name=job_name.strip(),
+            last_run=parse_dt(last_run),
+            last_result=last_result.strip(),
+            last_success=parse_dt(last_success),
             duration_minutes=dur,
-            notes=(r.get("notes") or "").strip(),
+            notes=notes.strip(),
         )
 
 
-def esc(x: Any) -> str:
-    return html.escape("" if x is None else str(x))
+@dataclass(slots=True)
+class Result:
+    """One report row; field order is the report.json key order."""
+
+    job_name: str
+    last_result: str
+    last_run: str
+    last_success: str
+    days_since_success: str
+    duration_minutes: str
+    status: str
+    reason: str
+    notes: str
+    # Negated days since success as displayed (2 dp); not written to report.json
+    sort_key: float = 0.0
+
+    def to_json(self) -> Dict[str, str]:
+        return {
+            "job_name": self.job_name,
+            "last_result": self.last_result,
+            "last_run": self.last_run,
+            "last_success": self.last_success,
+            "days_since_success": self.days_since_success,
+            "duration_minutes": self.duration_minutes,
+            "status": self.status,
+            "reason": self.reason,
+            "notes": self.notes,
+        }
+
+
+# CSV columns in Job.from_fields argument order
+JOB_COLUMNS = (
+    "job_name",
+    "last_run",
+    "last_result",
+    "last_success",
+    "duration_minutes",
+    "notes",
+)
 
 
 def load_thresholds(path: Path) -> Dict[str, Any]:
-    return json.loads(path.read_text(encoding="utf-8-sig"))
+    return read_json(path)
 
 
 def load_jobs(csv_path: Path) -> List[Job]:
+    # Resolve column positions from the header once and read rows as plain lists,
+    # rather than having csv.DictReader build a dict for every job.
     with csv_path.open("r", encoding="utf-8-sig", newline="") as f:
-        reader = csv.DictReader(f)
-        return [Job.from_row(r) for r in reader]
+        reader = csv.reader(f)
+        header = next(reader, [])
+        width = len(header)
+        # Missing columns point at the "" sentinel appended to each row
+        cols = [header.index(c) if c in header else width for c in JOB_COLUMNS]
+
+        jobs: List[Job] = []
+        for r in reader:
+            if not r:
+                continue
+            if len(r) < width:
+                r.extend([""] * (width - len(r)))
+            r.insert(width, "")
+            jobs.append(Job.from_fields(*[r[i] for i in cols]))
+        return jobs
+
+
+# last_result kinds, see JobRules.result_kind
+RESULT_OK, RESULT_WARN, RESULT_FAIL = 0, 1, 2
+
+
+@dataclass(frozen=True)
+class JobRules:
+    """thresholds.json values used by classify_job, normalized once per run."""
+
+    warn_results: FrozenSet[str]
+    fail_results: FrozenSet[str]
+    fail_on_warning_result: bool
+    warning_days: float
+    stale_days: float
+    # last_result text -> RESULT_* kind, filled in as new values are seen
+    _kinds: Dict[str, int] = field(default_factory=dict, compare=False, repr=False)
+
+    def result_kind(self, result: str) -> int:
+        kind = self._kinds.get(result)
+        if kind is None:
+            res = result.lower()
+            if res in self.fail_results:
+                kind = RESULT_FAIL
+            elif res in self.warn_results:
+                kind = RESULT_WARN
+            else:
+                kind = RESULT_OK
+            self._kinds[result] = kind
+        return kind
+
+    @staticmethod
+    def from_thresholds(t: Dict[str, Any]) -> "JobRules":
+        return JobRules(
+            warn_results=frozenset(
+                v.lower() for v in t.get("allowed_warning_values", ["warning"])
+            ),
+            fail_results=frozenset(
+                v.lower() for v in t.get("allowed_fail_values", ["failed", "error"])
+            ),
+            fail_on_warning_result=bool(t.get("fail_on_warning_result", False)),
+            warning_days=float(t.get("warning_days", 2)),
+            stale_days=float(t.get("stale_days", 3)),
+        )
 
 
-def classify_job(job: Job, now: datetime, t: Dict[str, Any]) -> Tuple[str, str]:
+def classify_job(job: Job, d: Optional[float], rules: JobRules) -> Tuple[str, str]:
     """
     Status: OK / WARN / ALERT
+    d is days since job.last_success (None when it is missing).
     Rules:
       - Failed results => ALERT
       - Warning results => WARN (or ALERT if fail_on_warning_result true)
       - Stale based on last_success days => WARN/ALERT
     """
-    allowed_success = set(
-        v.lower() for v in t.get("allowed_success_values", ["success"])
-    )
-    allowed_warn = set(v.lower() for v in t.get("allowed_warning_values", ["warning"]))
-    allowed_fail = set(
-        v.lower() for v in t.get("allowed_fail_values", ["failed", "error"])
-    )
+    kind = rules.result_kind(job.last_result)
 
-    res = (job.last_result or "").lower()
-
-    if res in allowed_fail:
+    if kind == RESULT_FAIL:
         return "ALERT", f"Last result is {job.last_result}"
-    if res in allowed_warn:
-        if t.get("fail_on_warning_result", False):
+    if kind == RESULT_WARN:
+        if rules.fail_on_warning_result:
             return "ALERT", f"Last result is {job.last_result}"
         # keep evaluating staleness too, but base status is WARN at least
         base = ("WARN", f"Last result is {job.last_result}")
     else:
         base = ("OK", "Last result OK")
 
-    warn_days = float(t.get("warning_days", 2))
-    stale_days = float(t.get("stale_days", 3))
-
-    d = days_since(job.last_success, now)
     if d is None:
         # no last_success is suspicious: treat as ALERT
         return "ALERT", "No last_success timestamp"
 
-    if d >= stale_days:
+    if d >= rules.stale_days:
         return "ALERT", f"Stale: last success {d:.1f} days ago"
-    if d >= warn_days:
+    if d >= rules.warning_days:
         # if already WARN, keep WARN; if OK, warn
         if base[0] == "OK":
             return "WARN", f"Approaching stale: last success {d:.1f} days ago"
@@ -120,146 +230,112 @@ def classify_job(job: Job, now: datetime, t: Dict[str, Any]) -> Tuple[str, str]:
     return base
 
 
-def make_table(headers: List[str], rows: List[List[Any]]) -> str:
-    th = "".join(f"<th>{esc(h)}</th>" for h in headers)
-    if not rows:
-        body = f"<tr><td colspan='{len(headers)}'><i>No data</i></td></tr>"
-    else:
-        body = "".join(
-            "<tr>" + "".join(f"<td>{esc(c)}</td>" for c in r) + "</tr>" for r in rows
-        )
-    return f"<table><thead><tr>{th}</tr></thead><tbody>{body}</tbody></table>"
-
-
-def badge(status: str) -> str:
-    cls = {"OK": "ok", "WARN": "warn", "ALERT": "bad"}.get(status, "ok")
-    return f"<span class='badge {cls}'>{esc(status)}</span>"
-
-
-def build_html(
-    now: datetime, jobs: List[Job], t: Dict[str, Any], results: List[Dict[str, Any]]
-) -> str:
-    total = len(results)
-    alerts = sum(1 for r in results if r["status"] == "ALERT")
-    warns = sum(1 for r in results if r["status"] == "WARN")
-    oks = sum(1 for r in results if r["status"] == "OK")
-
-    summary = make_table(
-        ["Total Jobs", "OK", "Warnings", "Alerts", "Stale Threshold"],
-        [
-            [
-                str(total),
-                str(oks),
-                str(warns),
-                str(alerts),
-                f"{t.get('stale_days', 3)} days",
-            ]
-        ],
-    )
-
-    # Sections
-    alert_rows = []
-    warn_rows = []
-    all_rows = []
-
-    for r in results:
-        all_rows.append(
-            [
-                badge(r["status"]),
-                r["job_name"],
-                r["last_result"],
-                r["last_run"],
-                r["last_success"],
-                r["days_since_success"],
-                r["duration_minutes"],
-                r["reason"],
-            ]
-        )
-        if r["status"] == "ALERT":
-            alert_rows.append(
-                [
-                    r["job_name"],
-                    r["last_result"],
-                    r["last_success"],
-                    r["days_since_success"],
-                    r["reason"],
-                ]
-            )
-        elif r["status"] == "WARN":
-            warn_rows.append(
-                [
-                    r["job_name"],
-                    r["last_result"],
-                    r["last_success"],
-                    r["days_since_success"],
-                    r["reason"],
-                ]
-            )
-
-    alerts_tbl = make_table(
-        ["Job", "Last Result", "Last Success", "Days Since Success", "Reason"],
-        alert_rows,
-    )
-    warns_tbl = make_table(
-        ["Job", "Last Result", "Last Success", "Days Since Success", "Reason"],
-        warn_rows,
-    )
-    all_tbl = make_table(
-        [
-            "Status",
-            "Job",
-            "Last Result",
-            "Last Run",
-            "Last Success",
-            "Days Since Success",
-            "Duration (min)",
-            "Notes",
-        ],
-        all_rows,
-    )
-
-    generated = now.strftime("%Y-%m-%d %H:%M:%S")
-
-    return f"""<!doctype html>
-<html>
-<head>
-  <meta charset="utf-8" />
-  <title>Backup Verification Report</title>
-  <style>
-    body {{ font-family: Segoe UI, Arial, sans-serif; margin: 24px; }}
-    h1 {{ margin-bottom: 6px; }}
-    .meta {{ color: #555; margin-bottom: 18px; }}
-    .badge {{ display: inline-block; padding: 2px 8px; border-radius: 999px; font-weight: 700; font-size: 12px; }}
-    .ok {{ background: #e9f7ef; }}
-    .warn {{ background: #fff4e5; }}
-    .bad {{ background: #fdecea; }}
-    table {{ border-collapse: collapse; width: 100%; margin: 10px 0 22px; }}
-    th, td {{ border: 1px solid #ddd; padding: 8px; font-size: 14px; vertical-align: top; }}
-    th {{ text-align: left; background: #f6f6f6; }}
-    code {{ background: #f4f4f4; padding: 2px 4px; border-radius: 4px; }}
-  </style>
-</head>
-<body>
-  <h1>Backup Verification Report</h1>
-  <div class="meta">
-    <div><b>Generated:</b> {esc(generated)}</div>
-    <div><b>Stale threshold:</b> {esc(t.get("stale_days", 3))} days since last successful backup</div>
+# Page-specific meta block; the %s holes are filled with esc_b() values
+HTML_META = b"""  <div class="meta">
+    <div><b>Generated:</b> %s</div>
+    <div><b>Stale threshold:</b> %s days since last successful backup</div>
   </div>
 
   <h2>Summary</h2>
-  {summary}
+  """
 
-  <h2>Alerts</h2>
-  {alerts_tbl}
 
-  <h2>Warnings</h2>
-  {warns_tbl}
+def write_html(
+    path: Path,
+    now: datetime,
+    t: Dict[str, Any],
+    alerts: List[Result],
+    warns: List[Result],
+    oks: List[Result],
+) -> None:
+    generated = now.strftime("%Y-%m-%d %H:%M:%S")
+    issue_headers = [
+        "Job",
+        "Last Result",
+        "Last Success",
+        "Days Since Success",
+        "Reason",
+    ]
+
+    with path.open("wb") as f:
+        write_html_header(
+            f, "Backup Verification Report", "Backup Verification Report"
+        )
+        f.write(HTML_META % (esc_b(generated), esc_b(t.get("stale_days", 3))))
+        f.writelines(
+            iter_table(
+                ["Total Jobs", "OK", "Warnings", "Alerts", "Stale Threshold"],
+                [
+                    [
+                        str(len(alerts) + len(warns) + len(oks)),
+                        str(len(oks)),
+                        str(len(warns)),
+                        str(len(alerts)),
+                        f"{t.get('stale_days', 3)} days",
+                    ]
+                ],
+            )
+        )
+
+        # Each bucket is walked once: the Alerts/Warnings tables are written
+        # straight through while the All Jobs rows are buffered for later.
+        all_buf = io.BytesIO()
+        for heading, status, bucket in (
+            (b"\n\n  <h2>Alerts</h2>\n  ", "ALERT", alerts),
+            (b"\n\n  <h2>Warnings</h2>\n  ", "WARN", warns),
+        ):
+            f.write(heading)
+            f.write(table_open(issue_headers))
+            for r in bucket:
+                jn = r.job_name
+                lr = r.last_result
+                ls = r.last_success
+                dss = r.days_since_success
+                rsn = r.reason
+                f.write(table_row([jn, lr, ls, dss, rsn]))
+                all_buf.write(
+                    badge_row(
+                        status,
+                        [jn, lr, r.last_run, ls, dss, r.duration_minutes, rsn],
+                    )
+                )
+            if not bucket:
+                f.write(no_data_row(len(issue_headers)))
+            f.write(TABLE_CLOSE)
+
+        for r in oks:
+            all_buf.write(
+                badge_row(
+                    "OK",
+                    [
+                        r.job_name,
+                        r.last_result,
+                        r.last_run,
+                        r.last_success,
+                        r.days_since_success,
+                        r.duration_minutes,
+                        r.reason,
+                    ],
+                )
+            )
 
-  <h2>All Jobs</h2>
-  {all_tbl}
-</body>
-</html>
-"""
+        f.write(b"\n\n  <h2>All Jobs</h2>\n  ")
+        f.writelines(
+            iter_buffered_table(
+                [
+                    "Status",
+                    "Job",
+                    "Last Result",
+                    "Last Run",
+                    "Last Success",
+                    "Days Since Success",
+                    "Duration (min)",
+                    "Notes",
+                ],
+                all_buf.getvalue(),
+            )
+        )
+        write_html_footer(f)
 
 
 def main() -> int:
@@ -283,58 +359,57 @@ def main() -> int:
     t = load_thresholds(thresholds_path)
     jobs = load_jobs(input_csv)
 
+    rules = JobRules.from_thresholds(t)
     now = datetime.now()
-    results: List[Dict[str, Any]] = []
+    # Results are bucketed by status as they are built, so the report never has
+    # to re-split a flat list.
+    buckets: Dict[str, List[Result]] = {"ALERT": [], "WARN": [], "OK": []}
 
     for job in jobs:
-        status, reason = classify_job(job, now, t)
         d = days_since(job.last_success, now)
-        results.append(
-            {
-                "job_name": job.job_name,
-                "last_result": job.last_result,
-                "last_run": job.last_run.isoformat(sep="T", timespec="seconds")
+        status, reason = classify_job(job, d, rules)
+        buckets[status].append(
+            Result(
+                job_name=job.job_name,
+                last_result=job.last_result,
+                last_run=job.last_run.isoformat(sep="T", timespec="seconds")
                 if job.last_run
                 else "",
-                "last_success": job.last_success.isoformat(sep="T", timespec="seconds")
+                last_success=job.last_success.isoformat(sep="T", timespec="seconds")
                 if job.last_success
                 else "",
-                "days_since_success": f"{d:.2f}" if d is not None else "",
-                "duration_minutes": f"{job.duration_minutes:.1f}"
+                days_since_success=f"{d:.2f}" if d is not None else "",
+                duration_minutes=f"{job.duration_minutes:.1f}"
                 if job.duration_minutes is not None
                 else "",
-                "status": status,
-                "reason": reason,
-                "notes": job.notes,
-            }
+                status=status,
+                reason=reason,
+                notes=job.notes,
+                sort_key=-round(d, 2) if d is not None else 0.0,
+            )
         )
 
-    # Sort: ALERT first, then WARN, then OK; within that by days since success descending
-    order = {"ALERT": 0, "WARN": 1, "OK": 2}
-
-    def sort_key(r: Dict[str, Any]) -> Tuple[int, float]:
-        d = 0.0
-        try:
-            d = float(r["days_since_success"]) if r["days_since_success"] else 0.0
-        except Exception:
-            d = 0.0
-        return (order.get(r["status"], 9), -d)
-
-    results.sort(key=sort_key)
-
-    html_out = build_html(now, jobs, t, results)
-    (outdir / "report.html").write_text(html_out, encoding="utf-8")
-    (outdir / "report.json").write_text(
-        json.dumps(
-            {
-                "generated_at": now.isoformat(timespec="seconds"),
-                "thresholds": t,
-                "results": results,
-            },
-            indent=2,
-        ),
-        encoding="utf-8",
-    )
+    # Sort each bucket by days since success descending; buckets go ALERT, WARN, OK
+    alerts, warns, oks = buckets["ALERT"], buckets["WARN"], buckets["OK"]
+    for bucket in (alerts, warns, oks):
+        bucket.sort(key=attrgetter("sort_key"))
+    results = alerts + warns + oks
+
+    report_json = {
+        "generated_at": now.isoformat(timespec="seconds"),
+        "thresholds": t,
+        "results": [r.to_json() for r in results],
+    }
+
+    # Re-running against the same outdir with the same data leaves the files alone
+    digest = rerun_digest(outdir, report_json)
+    if digest is not None and report_unchanged(outdir, digest):
+        print(f"Unchanged: {outdir / 'report.html'}")
+        return 0
+
+    write_html(outdir / "report.html", now, t, alerts, warns, oks)
+    (outdir / "report.json").write_bytes(json_dumps(report_json))
+    write_report_sig(outdir, digest)
 
     print(f"Wrote: {outdir / 'report.html'}")
     print(f"Wrote: {outdir / 'report.json'}")
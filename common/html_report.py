@@ -0,0 +1,179 @@
+"""
+HTML rendering helpers shared by the Endpoint-health-checker, backup-verifier and
+log-parser reports. This is the only copy; each project's run.ps1 puts this folder on
+PYTHONPATH before it starts report.py.
+
+Static fragments (page head, table header rows) are cached per process, so a
+caller that renders reports repeatedly only builds them once.
+"""
+
+from __future__ import annotations
+
+from functools import lru_cache
+from typing import IO, Any, Dict, Iterable, Iterator, List, Sequence, Tuple, Union
+
+# Same replacements as html.escape(quote=True), done in a single pass
+_ESC_TABLE = str.maketrans(
+    {"&": "&amp;", "<": "&lt;", ">": "&gt;", '"': "&quot;", "'": "&#x27;"}
+)
+
+# MarkupSafe is optional; its C escape is faster still. It writes quotes as
+# &#34;/&#39; rather than &quot;/&#x27;, which browsers render identically.
+try:
+    from markupsafe import escape as _markup_escape
+except ImportError:
+    _markup_escape = None
+
+
+if _markup_escape is not None:
+    _escape_str = _markup_escape
+else:
+
+    def _escape_str(s: str) -> str:
+        return s.translate(_ESC_TABLE)
+
+
+# Levels, statuses, providers and service names repeat on every row
+_escape_cached = lru_cache(maxsize=4096)(_escape_str)
+
+
+def esc(x: Any) -> str:
+    if x is None:
+        return ""
+    if not isinstance(x, str):
+        x = str(x)
+    # Most cells (numbers, timestamps, levels) have nothing to escape
+    if (
+        "&" not in x
+        and "<" not in x
+        and ">" not in x
+        and '"' not in x
+        and "'" not in x
+    ):
+        return x
+    return _escape_cached(x)
+
+
+def esc_b(x: Any) -> bytes:
+    return esc(x).encode("utf-8")
+
+
+_BADGE_BYTES = {
+    "OK": b"<span class='badge ok'>OK</span>",
+    "WARN": b"<span class='badge warn'>WARN</span>",
+    "ALERT": b"<span class='badge bad'>ALERT</span>",
+}
+
+
+def badge(status: str) -> bytes:
+    b = _BADGE_BYTES.get(status)
+    if b is None:
+        b = f"<span class='badge ok'>{esc(status)}</span>".encode("utf-8")
+    return b
+
+
+def table_open(headers: Sequence[str]) -> bytes:
+    return _table_open(tuple(headers))
+
+
+@lru_cache(maxsize=64)
+def _table_open(headers: Tuple[str, ...]) -> bytes:
+    th = "".join(f"<th>{esc(h)}</th>" for h in headers)
+    return f"<table><thead><tr>{th}</tr></thead><tbody>".encode("utf-8")
+
+
+def table_cells(cells: Iterable[Any]) -> bytes:
+    return "".join(f"<td>{esc(c)}</td>" for c in cells).encode("utf-8")
+
+
+def table_row(cells: Iterable[Any]) -> bytes:
+    return b"<tr>" + table_cells(cells) + b"</tr>"
+
+
+def record_row(record: Dict[str, Any], keys: Sequence[str]) -> bytes:
+    """<tr> with one cell per key, read straight from a source dict."""
+    return (
+        b"<tr><td>"
+        + b"</td><td>".join([esc_b(record.get(k, "")) for k in keys])
+        + b"</td></tr>"
+    )
+
+
+def badge_row(status: str, cells: Iterable[Any]) -> bytes:
+    # The badge markup is trusted; only the data cells are escaped
+    return b"<tr><td>" + badge(status) + b"</td>" + table_cells(cells) + b"</tr>"
+
+
+def no_data_row(colspan: int) -> bytes:
+    return f"<tr><td colspan='{colspan}'><i>No data</i></td></tr>".encode("utf-8")
+
+
+TABLE_CLOSE = b"</tbody></table>"
+
+
+def iter_table(
+    headers: List[str], rows: Iterable[Union[bytes, Iterable[Any]]]
+) -> Iterator[bytes]:
+    """Rows are lists of cells to escape, or already-rendered <tr> bytes."""
+    yield table_open(headers)
+    empty = True
+    for r in rows:
+        empty = False
+        yield r if isinstance(r, bytes) else table_row(r)
+    if empty:
+        yield no_data_row(len(headers))
+    yield TABLE_CLOSE
+
+
+def iter_buffered_table(headers: List[str], body: bytes) -> Iterator[bytes]:
+    """Like iter_table, for a body of <tr> rows that was rendered ahead of time."""
+    yield table_open(headers)
+    yield body or no_data_row(len(headers))
+    yield TABLE_CLOSE
+
+
+_HTML_OPEN = b"""<!doctype html>
+<html>
+<head>
+  <meta charset="utf-8" />
+  <title>%s</title>
+"""
+
+_HTML_STYLE = b"""  <style>
+    body { font-family: Segoe UI, Arial, sans-serif; margin: 24px; }
+    h1 { margin-bottom: 6px; }
+    .meta { color: #555; margin-bottom: 18px; }
+    .badge { display: inline-block; padding: 2px 8px; border-radius: 999px; font-weight: 700; font-size: 12px; }
+    .ok { background: #e9f7ef; }
+    .warn { background: #fff4e5; }
+    .bad { background: #fdecea; }
+    table { border-collapse: collapse; width: 100%; margin: 10px 0 22px; }
+    th, td { border: 1px solid #ddd; padding: 8px; font-size: 14px; vertical-align: top; }
+    th { text-align: left; background: #f6f6f6; }
+    code { background: #f4f4f4; padding: 2px 4px; border-radius: 4px; }
+  </style>
+</head>
+<body>
+"""
+
+_HTML_H1 = b"  <h1>%s</h1>\n"
+
+_HTML_FOOT = b"""
+</body>
+</html>
+"""
+
+
+@lru_cache(maxsize=16)
+def html_header(title: str, heading: str) -> bytes:
+    return b"".join(
+        (_HTML_OPEN % esc_b(title), _HTML_STYLE, _HTML_H1 % esc_b(heading))
+    )
+
+
+def write_html_header(f: IO[bytes], title: str, heading: str) -> None:
+    f.write(html_header(title, heading))
+
+
+def write_html_footer(f: IO[bytes]) -> None:
+    f.write(_HTML_FOOT)
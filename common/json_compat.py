@@ -0,0 +1,49 @@
+"""
+JSON encode/decode shared by the project reports. orjson and ujson are optional;
+the stdlib keeps the scripts working on a bare install.
+
+json_loads takes bytes or str; json_dumps returns UTF-8 bytes indented by two
+spaces, in the same layout whichever backend is loaded. read_json loads a file
+written by the PowerShell collectors.
+"""
+
+from __future__ import annotations
+
+import codecs
+import json
+from pathlib import Path
+from typing import Any
+
+try:
+    import orjson
+
+    def json_loads(data: bytes) -> Any:
+        return orjson.loads(data)
+
+    def json_dumps(obj: Any) -> bytes:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2)
+
+except ImportError:
+    try:
+        import ujson
+
+        def json_loads(data: bytes) -> Any:
+            return ujson.loads(data)
+
+        def json_dumps(obj: Any) -> bytes:
+            return ujson.dumps(obj, indent=2, escape_forward_slashes=False).encode(
+                "utf-8"
+            )
+
+    except ImportError:
+
+        def json_loads(data: bytes) -> Any:
+            return json.loads(data)
+
+        def json_dumps(obj: Any) -> bytes:
+            return json.dumps(obj, indent=2).encode("utf-8")
+
+
+def read_json(path: Path) -> Any:
+    # PowerShell writes UTF-8 with a BOM; strip it and hand the raw bytes to the parser
+    return json_loads(path.read_bytes().removeprefix(codecs.BOM_UTF8))
@@ -0,0 +1,43 @@
+"""
+Change detection for the project reports. When report.py is re-run against a
+folder that already holds a report, report.json.sig records a content hash so a
+later re-run over unchanged input can skip rewriting it. A first run into a fresh
+folder (what run.ps1 does) writes no sidecar, so ticket bundles don't carry one.
+"""
+
+from __future__ import annotations
+
+import hashlib
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from json_compat import json_dumps
+
+
+def report_digest(report: Dict[str, Any]) -> str:
+    # generated_at changes every run, so it is left out of the comparison
+    content = {k: v for k, v in report.items() if k != "generated_at"}
+    return hashlib.blake2b(json_dumps(content), digest_size=16).hexdigest()
+
+
+def report_unchanged(outdir: Path, digest: str) -> bool:
+    """True when report.json.sig matches digest and both reports are still there."""
+    sig = outdir / "report.json.sig"
+    return (
+        sig.exists()
+        and sig.read_text(encoding="utf-8").strip() == digest
+        and (outdir / "report.json").exists()
+        and (outdir / "report.html").exists()
+    )
+
+
+def rerun_digest(outdir: Path, report: Dict[str, Any]) -> Optional[str]:
+    """Digest to check and record when outdir already has a report.json, else None."""
+    if not (outdir / "report.json").exists():
+        return None
+    return report_digest(report)
+
+
+def write_report_sig(outdir: Path, digest: Optional[str]) -> None:
+    if digest is not None:
+        (outdir / "report.json.sig").write_text(digest, encoding="utf-8")
@@ -41,9 +41,12 @@ function New-DirectoryIfMissing($path) {
 $repoRoot = Split-Path -Parent $MyInvocation.MyCommand.Path
 $collectPs1 = Join-Path $repoRoot "src\collect.ps1"
 $reportPy = Join-Path $repoRoot "src\report.py"
+# Shared Python helpers (json_compat.py) live in the repo-level common folder
+$commonDir = Join-Path (Split-Path -Parent $repoRoot) "common"
 
 if (-not (Test-Path -LiteralPath $collectPs1)) { throw "Missing collector script: $collectPs1" }
 if (-not (Test-Path -LiteralPath $reportPy)) { throw "Missing report script: $reportPy" }
+if (-not (Test-Path -LiteralPath $commonDir)) { throw "Missing shared helpers: $commonDir" }
 
 # --- Output folder naming ---
 $ts = Get-Date -Format "yyyyMMdd_HHmmss"
@@ -79,6 +82,7 @@ if (-not $?) { throw "Collection failed." }
 
 # --- Run report generation ---
 Write-Step "Generating report..."
+$env:PYTHONPATH = if ($env:PYTHONPATH) { "$commonDir;$env:PYTHONPATH" } else { $commonDir }
 & python $reportPy --outdir $outDir --minutes $Minutes
 if ($LASTEXITCODE -ne 0) { throw "Report generation failed with exit code $LASTEXITCODE" }
 
@@ -98,7 +98,8 @@ catch {
 
     $events |
     Select-Object `
-    @{n = "TimeCreated"; e = { $_.TimeCreated } },
+    # Round-trip ISO 8601 (local time with offset) so report.py can sort the column as text
+    @{n = "TimeCreated"; e = { if ($_.TimeCreated) { $_.TimeCreated.ToString("o") } else { "" } } },
     @{n = "LevelDisplayName"; e = { $_.LevelDisplayName } },
     @{n = "ProviderName"; e = { $_.ProviderName } },
     @{n = "EventID"; e = { $_.Id } },
@@ -2,12 +2,21 @@ from __future__ import annotations
 
 import argparse
 import csv
-import html
-import json
-import re
+import heapq
+from collections import Counter, namedtuple
 from datetime import datetime
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from html_report import badge, esc, html_header
+from json_compat import json_dumps, read_json
+
+# pyarrow is optional; its C++ CSV reader is much faster on large event logs
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+except ImportError:
+    pa_csv = None
 
 
 def normalize_counter_path(raw: str) -> str:
@@ -17,79 +26,103 @@ def normalize_counter_path(raw: str) -> str:
     and lowercases for stable matching.
     """
     s = raw.strip()
-    m = re.match(r"^\\\\[^\\]+\\(.*)$", s)
-    if m:
-        s = "\\" + m.group(1)
+    if s.startswith("\\\\"):
+        host, sep, rest = s[2:].partition("\\")
+        if host and sep:
+            s = "\\" + rest
     return s.lower()
 
 
+# Keep it simple: title-case common ones for display
+_FRIENDLY_NAMES = {
+    r"\processor(_total)\% processor time": "CPU % Processor Time (Total)",
+    r"\memory\% committed bytes in use": "Memory % Committed Bytes In Use",
+    r"\memory\available mbytes": "Memory Available MB",
+    r"\physicaldisk(_total)\avg. disk queue length": "Disk Avg. Disk Queue Length (Total)",
+}
+
+
 def friendly_counter_name(norm: str) -> str:
-    # Keep it simple: title-case common ones for display
-    mapping = {
-        r"\processor(_total)\% processor time": "CPU % Processor Time (Total)",
-        r"\memory\% committed bytes in use": "Memory % Committed Bytes In Use",
-        r"\memory\available mbytes": "Memory Available MB",
-        r"\physicaldisk(_total)\avg. disk queue length": "Disk Avg. Disk Queue Length (Total)",
-    }
-    return mapping.get(norm, norm)
+    return _FRIENDLY_NAMES.get(norm, norm)
 
 
-def classify_perf(norm: str, avg: float, maxv: float) -> Tuple[str, str]:
-    """
-    Returns (status, reason). Status in: OK / WARN / ALERT
-    """
-    # Simple, credible defaults (tune later or move to thresholds.json)
-    thresholds = {
-        r"\processor(_total)\% processor time": {"warn": 70.0, "alert": 85.0},
-        r"\memory\% committed bytes in use": {"warn": 75.0, "alert": 85.0},
-        r"\physicaldisk(_total)\avg. disk queue length": {"warn": 2.0, "alert": 4.0},
-        # Available MB is inverse (low is bad)
-        r"\memory\available mbytes": {"warn_low": 1024.0, "alert_low": 512.0},
-    }
+# Simple, credible defaults (tune later or move to thresholds.json)
+_THRESHOLDS: Dict[str, Dict[str, float]] = {
+    r"\processor(_total)\% processor time": {"warn": 70.0, "alert": 85.0},
+    r"\memory\% committed bytes in use": {"warn": 75.0, "alert": 85.0},
+    r"\physicaldisk(_total)\avg. disk queue length": {"warn": 2.0, "alert": 4.0},
+    # Available MB is inverse (low is bad)
+    r"\memory\available mbytes": {"warn_low": 1024.0, "alert_low": 512.0},
+}
+
 
-    t = thresholds.get(norm)
-    if not t:
-        return "OK", "No threshold set"
+def _high_classifier(warn: float, alert: float) -> Callable[[float, float], Tuple[str, str]]:
+    # High-is-bad metrics
+    def classify(avg: float, maxv: float) -> Tuple[str, str]:
+        if maxv >= alert or avg >= alert:
+            return "ALERT", f"High usage (avg={avg:.1f}, max={maxv:.1f})"
+        if maxv >= warn or avg >= warn:
+            return "WARN", f"Elevated usage (avg={avg:.1f}, max={maxv:.1f})"
+        return "OK", "Within normal range"
+
+    return classify
 
+
+def _low_classifier(warn_low: float, alert_low: float) -> Callable[[float, float], Tuple[str, str]]:
     # Low-is-bad metric
-    if "warn_low" in t:
-        if maxv <= t["alert_low"] or avg <= t["alert_low"]:
+    def classify(avg: float, maxv: float) -> Tuple[str, str]:
+        if maxv <= alert_low or avg <= alert_low:
             return "ALERT", f"Low available memory (avg={avg:.1f} MB, max={maxv:.1f} MB)"
-        if maxv <= t["warn_low"] or avg <= t["warn_low"]:
+        if maxv <= warn_low or avg <= warn_low:
             return "WARN", f"Low available memory (avg={avg:.1f} MB, max={maxv:.1f} MB)"
         return "OK", "Within normal range"
 
-    # High-is-bad metrics
-    if maxv >= t["alert"] or avg >= t["alert"]:
-        return "ALERT", f"High usage (avg={avg:.1f}, max={maxv:.1f})"
-    if maxv >= t["warn"] or avg >= t["warn"]:
-        return "WARN", f"Elevated usage (avg={avg:.1f}, max={maxv:.1f})"
-    return "OK", "Within normal range"
+    return classify
+
 
+def _unclassified(avg: float, maxv: float) -> Tuple[str, str]:
+    return "OK", "No threshold set"
 
-def read_perf_summary(path: Path) -> List[Dict[str, Any]]:
-    rows: List[Dict[str, Any]] = []
+
+# One classifier per counter with its thresholds bound in, built once at import
+_CLASSIFIERS: Dict[str, Callable[[float, float], Tuple[str, str]]] = {
+    norm: _low_classifier(t["warn_low"], t["alert_low"]) if "warn_low" in t else _high_classifier(t["warn"], t["alert"])
+    for norm, t in _THRESHOLDS.items()
+}
+
+
+def classify_perf(norm: str, avg: float, maxv: float) -> Tuple[str, str]:
+    """
+    Returns (status, reason). Status in: OK / WARN / ALERT
+    """
+    return _CLASSIFIERS.get(norm, _unclassified)(avg, maxv)
+
+
+# One parsed perf_summary.csv row; field names match the report.json "perf" objects
+PerfRow = namedtuple("PerfRow", "counter_raw counter_norm counter_name avg max samples status reason")
+
+
+def read_perf_summary(path: Path) -> List[PerfRow]:
+    rows: List[PerfRow] = []
     with path.open("r", encoding="utf-8-sig", newline="") as f:
-        reader = csv.DictReader(f)
+        # Plain csv.reader with header indices, so no dict is built per row
+        reader = csv.reader(f)
+        header = next(reader, None)
+        if header is None:
+            return rows
+        cols = {name: i for i, name in enumerate(header)}
+        i_counter, i_avg, i_max, i_samples = (cols.get(k, -1) for k in ("Counter", "Avg", "Max", "Samples"))
         for r in reader:
-            raw = r.get("Counter", "") or ""
-            avg = float(r.get("Avg", "0") or 0)
-            maxv = float(r.get("Max", "0") or 0)
-            samples = int(float(r.get("Samples", "0") or 0))
+            if not r:
+                continue  # DictReader skips blank lines too
+            n = len(r)
+            raw = r[i_counter] if 0 <= i_counter < n else ""
+            avg = float((r[i_avg] if 0 <= i_avg < n else "") or 0)
+            maxv = float((r[i_max] if 0 <= i_max < n else "") or 0)
+            samples = int(float((r[i_samples] if 0 <= i_samples < n else "") or 0))
             norm = normalize_counter_path(raw)
             status, reason = classify_perf(norm, avg, maxv)
-            rows.append(
-                {
-                    "counter_raw": raw,
-                    "counter_norm": norm,
-                    "counter_name": friendly_counter_name(norm),
-                    "avg": avg,
-                    "max": maxv,
-                    "samples": samples,
-                    "status": status,
-                    "reason": reason,
-                }
-            )
+            rows.append(PerfRow(raw, norm, friendly_counter_name(norm), avg, maxv, samples, status, reason))
     return rows
 
 
@@ -97,61 +130,97 @@ def read_events_csv(path: Path) -> List[Dict[str, str]]:
     # Your CSV headers: TimeCreated,LevelDisplayName,ProviderName,EventID,TaskDisplayName,MachineName,Message
     if not path.exists():
         return []
+    if pa_csv is not None:
+        try:
+            return _read_events_arrow(path)
+        except (pa.ArrowInvalid, StopIteration):
+            pass  # empty or ragged file: let DictReader deal with it
     with path.open("r", encoding="utf-8-sig", newline="") as f:
-        reader = csv.DictReader(f)
-        return [dict(r) for r in reader]
+        # DictReader already yields a fresh plain dict per row; no need to copy it
+        return list(csv.DictReader(f))
+
+
+def _read_events_arrow(path: Path) -> List[Dict[str, str]]:
+    # Force every column to string so rows match what DictReader returns
+    with path.open("r", encoding="utf-8-sig", newline="") as f:
+        header = next(csv.reader(f))
+    convert = pa_csv.ConvertOptions(
+        column_types={name: pa.string() for name in header},
+        strings_can_be_null=False,
+        quoted_strings_can_be_null=False,
+    )
+    parse = pa_csv.ParseOptions(newlines_in_values=True)
+    return pa_csv.read_csv(path, parse_options=parse, convert_options=convert).to_pylist()
 
 
 def count_by_level(events: List[Dict[str, str]]) -> Dict[str, int]:
-    counts: Dict[str, int] = {}
-    for e in events:
-        lvl = (e.get("LevelDisplayName") or "").strip() or "Unknown"
-        counts[lvl] = counts.get(lvl, 0) + 1
-    return counts
+    return dict(Counter((e.get("LevelDisplayName") or "").strip() or "Unknown" for e in events))
 
 
-def newest_events(events: List[Dict[str, str]], limit: int = 20) -> List[Dict[str, str]]:
-    # TimeCreated is usually parseable by datetime.fromisoformat, but may vary.
-    # We'll sort by string if parsing fails—good enough for v1.
-    def key(e: Dict[str, str]) -> str:
-        return (e.get("TimeCreated") or "").strip()
+# Levels shown in the "Newest" tables
+_NOISY_LEVELS = frozenset({"Critical", "Error", "Warning"})
+# Levels with their own column in the event summary; everything else is Other/Unknown
+_SUMMARY_LEVELS = ("Critical", "Error", "Warning", "Information")
+# Perf statuses listed under Alerts
+_ALERT_STATUSES = frozenset({"WARN", "ALERT"})
 
-    return sorted(events, key=key, reverse=True)[:limit]
 
+def newest_events(events: Iterable[Dict[str, str]], limit: int = 20) -> List[Dict[str, str]]:
+    # The key is the raw TimeCreated string; nothing is parsed. collect.ps1 writes it
+    # with ToString("o") (ISO 8601 with the local offset), so text order is
+    # chronological while the offset stays the same. CSVs from older collectors hold
+    # locale strings like "1/17/2026 2:10:00 AM", which only sort as text.
+    def key(e: Dict[str, str]) -> str:
+        return (e.get("TimeCreated") or "").strip()
 
-def esc(s: Any) -> str:
-    return html.escape("" if s is None else str(s))
+    # Same result as sorted(reverse=True)[:limit] without sorting the whole log
+    return heapq.nlargest(limit, events, key=key)
 
 
 def make_table(headers: List[str], rows: List[List[Any]]) -> str:
-    th = "".join(f"<th>{esc(h)}</th>" for h in headers)
-    tr_parts = []
+    # Emit tokens into one list and join once, rather than joining per row and per table
+    out = ["<table><thead><tr>"]
+    append = out.append
+    for h in headers:
+        append("<th>")
+        append(esc(h))
+        append("</th>")
+    append("</tr></thead><tbody>")
     for r in rows:
-        tds = "".join(f"<td>{esc(c)}</td>" for c in r)
-        tr_parts.append(f"<tr>{tds}</tr>")
-    body = "".join(tr_parts) if tr_parts else f"<tr><td colspan='{len(headers)}'><i>No data</i></td></tr>"
-    return f"<table><thead><tr>{th}</tr></thead><tbody>{body}</tbody></table>"
+        append("<tr>")
+        for c in r:
+            append("<td>")
+            append(esc(c))
+            append("</td>")
+        append("</tr>")
+    if not rows:
+        append(f"<tr><td colspan='{len(headers)}'><i>No data</i></td></tr>")
+    append("</tbody></table>")
+    return "".join(out)
 
 
 def status_badge(status: str) -> str:
-    cls = {"OK": "ok", "WARN": "warn", "ALERT": "bad"}.get(status, "ok")
-    return f"<span class='badge {cls}'>{esc(status)}</span>"
+    # Same markup as the other reports; the page is built as str here
+    return badge(status).decode("utf-8")
 
 
-def build_html(
+def iter_html(
     sysinfo: Dict[str, Any],
-    perf: List[Dict[str, Any]],
+    perf: List[PerfRow],
     sys_events: List[Dict[str, str]],
     app_events: List[Dict[str, str]],
     window_minutes: int,
-) -> str:
+) -> Iterator[str]:
+    """
+    Yields the report page section by section so it can be written as it is built.
+    """
     generated_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
     # Alerts section
-    alerts = [p for p in perf if p["status"] in ("WARN", "ALERT")]
+    alerts = [p for p in perf if p.status in _ALERT_STATUSES]
     if alerts:
         alerts_html = "<ul>" + "".join(
-            f"<li>{status_badge(a['status'])} <b>{esc(a['counter_name'])}</b>: {esc(a['reason'])}</li>"
+            f"<li>{status_badge(a.status)} <b>{esc(a.counter_name)}</b>: {esc(a.reason)}</li>"
             for a in alerts
         ) + "</ul>"
     else:
@@ -161,12 +230,12 @@ def build_html(
     perf_rows = []
     for p in perf:
         perf_rows.append([
-            p["counter_name"],
-            f"{p['avg']:.3f}",
-            f"{p['max']:.3f}",
-            str(p["samples"]),
-            p["status"],
-            p["reason"],
+            p.counter_name,
+            f"{p.avg:.3f}",
+            f"{p.max:.3f}",
+            str(p.samples),
+            p.status,
+            p.reason,
         ])
     perf_table = make_table(
         ["Counter", "Avg", "Max", "Samples", "Status", "Notes"],
@@ -176,6 +245,9 @@ def build_html(
     # Event summaries
     sys_counts = count_by_level(sys_events)
     app_counts = count_by_level(app_events)
+    # Every event lands in exactly one level bucket, so the rest is total minus the known four
+    sys_other = len(sys_events) - sum(sys_counts.get(k, 0) for k in _SUMMARY_LEVELS)
+    app_other = len(app_events) - sum(app_counts.get(k, 0) for k in _SUMMARY_LEVELS)
     events_summary = make_table(
         ["Log", "Critical", "Error", "Warning", "Information", "Other/Unknown", "Total"],
         [
@@ -185,7 +257,7 @@ def build_html(
                 str(sys_counts.get("Error", 0)),
                 str(sys_counts.get("Warning", 0)),
                 str(sys_counts.get("Information", 0)),
-                str(sum(v for k, v in sys_counts.items() if k not in ("Critical", "Error", "Warning", "Information"))),
+                str(sys_other),
                 str(len(sys_events)),
             ],
             [
@@ -194,25 +266,28 @@ def build_html(
                 str(app_counts.get("Error", 0)),
                 str(app_counts.get("Warning", 0)),
                 str(app_counts.get("Information", 0)),
-                str(sum(v for k, v in app_counts.items() if k not in ("Critical", "Error", "Warning", "Information"))),
+                str(app_other),
                 str(len(app_events)),
             ],
         ],
     )
 
     # Newest events (only show noisy ones typically)
-    newest_sys = newest_events([e for e in sys_events if (e.get("LevelDisplayName") or "") in ("Critical", "Error", "Warning")], 20)
-    newest_app = newest_events([e for e in app_events if (e.get("LevelDisplayName") or "") in ("Critical", "Error", "Warning")], 20)
+    # None (short row) is simply not in the set, so no `or ""` default is needed
+    newest_sys = newest_events((e for e in sys_events if e.get("LevelDisplayName") in _NOISY_LEVELS), 20)
+    newest_app = newest_events((e for e in app_events if e.get("LevelDisplayName") in _NOISY_LEVELS), 20)
 
     def event_rows(events: List[Dict[str, str]]) -> List[List[Any]]:
         rows = []
         for e in events:
+            msg = e.get("Message") or ""
+            # esc() renders None as "", so missing cells need no default
             rows.append([
-                e.get("TimeCreated", ""),
-                e.get("LevelDisplayName", ""),
-                e.get("ProviderName", ""),
-                e.get("EventID", ""),
-                (e.get("Message", "") or "")[:200] + ("..." if (e.get("Message", "") or "") and len(e.get("Message", "")) > 200 else ""),
+                e.get("TimeCreated"),
+                e.get("LevelDisplayName"),
+                e.get("ProviderName"),
+                e.get("EventID"),
+                msg[:200] + "..." if len(msg) > 200 else msg,
             ])
         return rows
 
@@ -223,28 +298,9 @@ def build_html(
     osname = sysinfo.get("OS") or "Unknown"
     boot = sysinfo.get("BootTime") or "Unknown"
 
-    return f"""<!doctype html>
-<html>
-<head>
-  <meta charset="utf-8" />
-  <title>Log Report - {esc(host)}</title>
-  <style>
-    body {{ font-family: Segoe UI, Arial, sans-serif; margin: 24px; }}
-    h1 {{ margin-bottom: 6px; }}
-    .meta {{ color: #555; margin-bottom: 18px; }}
-    .badge {{ display: inline-block; padding: 2px 8px; border-radius: 999px; font-weight: 700; font-size: 12px; }}
-    .ok {{ background: #e9f7ef; }}
-    .warn {{ background: #fff4e5; }}
-    .bad {{ background: #fdecea; }}
-    table {{ border-collapse: collapse; width: 100%; margin: 10px 0 22px; }}
-    th, td {{ border: 1px solid #ddd; padding: 8px; font-size: 14px; vertical-align: top; }}
-    th {{ text-align: left; background: #f6f6f6; }}
-    code {{ background: #f4f4f4; padding: 2px 4px; border-radius: 4px; }}
-  </style>
-</head>
-<body>
-  <h1>Log Report</h1>
-  <div class="meta">
+    # Doctype, title, shared stylesheet and <h1>, same as the other reports
+    yield html_header(f"Log Report - {host}", "Log Report").decode("utf-8")
+    yield f"""  <div class="meta">
     <div><b>Host:</b> {esc(host)}</div>
     <div><b>OS:</b> {esc(osname)}</div>
     <div><b>Boot Time:</b> {esc(boot)}</div>
@@ -253,22 +309,17 @@ def build_html(
   </div>
 
   <h2>Alerts</h2>
-  {alerts_html}
-
-  <h2>Performance Summary</h2>
-  {perf_table}
-
-  <h2>Event Summary</h2>
-  {events_summary}
-
-  <h2>Newest System (Critical/Error/Warning)</h2>
-  {newest_sys_tbl}
-
-  <h2>Newest Application (Critical/Error/Warning)</h2>
-  {newest_app_tbl}
-</body>
-</html>
-"""
+  """
+    yield alerts_html
+    yield "\n\n  <h2>Performance Summary</h2>\n  "
+    yield perf_table
+    yield "\n\n  <h2>Event Summary</h2>\n  "
+    yield events_summary
+    yield "\n\n  <h2>Newest System (Critical/Error/Warning)</h2>\n  "
+    yield newest_sys_tbl
+    yield "\n\n  <h2>Newest Application (Critical/Error/Warning)</h2>\n  "
+    yield newest_app_tbl
+    yield "\n</body>\n</html>\n"
 
 
 def main() -> int:
@@ -288,28 +339,27 @@ def main() -> int:
     if not perf_path.exists():
         raise FileNotFoundError(f"Missing {perf_path}")
 
-    sysinfo = json.loads(sysinfo_path.read_text(encoding="utf-8-sig"))
+    sysinfo = read_json(sysinfo_path)
     perf = read_perf_summary(perf_path)
     sys_events = read_events_csv(sys_events_path)
     app_events = read_events_csv(app_events_path)
 
-    report_html = build_html(sysinfo, perf, sys_events, app_events, window_minutes=args.minutes)
-
     html_path = outdir / "report.html"
-    html_path.write_text(report_html, encoding="utf-8")
+    with html_path.open("w", encoding="utf-8") as f:
+        f.writelines(iter_html(sysinfo, perf, sys_events, app_events, window_minutes=args.minutes))
 
     # Optional machine-readable output
     report_json = {
         "generated_at": datetime.now().isoformat(timespec="seconds"),
         "window_minutes": args.minutes,
         "system_info": sysinfo,
-        "perf": perf,
+        "perf": [p._asdict() for p in perf],
         "event_counts": {
             "system": count_by_level(sys_events),
             "application": count_by_level(app_events),
         },
     }
-    (outdir / "report.json").write_text(json.dumps(report_json, indent=2), encoding="utf-8")
+    (outdir / "report.json").write_bytes(json_dumps(report_json))
 
     print(f"Wrote: {html_path}")
     print(f"Wrote: {outdir / 'report.json'}")